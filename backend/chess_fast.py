@@ -0,0 +1,130 @@
+"""
+Fast SAN generation for every legal move in a position.
+
+python-chess's Board.san() disambiguates each move by generating legal moves again
+and detects check by pushing and popping the move. Building SAN for the whole move
+list at once lets us disambiguate from a single pass over the legal moves and test
+for check with bitboard attacks, only pushing the move when it actually gives check
+(to tell "+" from "#") or for castling.
+"""
+from __future__ import annotations
+import chess
+from chess import (
+    BB_SQUARES, BB_RANKS, BB_FILES,
+    BB_PAWN_ATTACKS, BB_KNIGHT_ATTACKS,
+    BB_DIAG_ATTACKS, BB_DIAG_MASKS,
+    BB_FILE_ATTACKS, BB_FILE_MASKS,
+    BB_RANK_ATTACKS, BB_RANK_MASKS,
+    FILE_NAMES, RANK_NAMES, SQUARE_NAMES,
+    PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING,
+    square_file, square_rank,
+)
+
+# SAN piece prefix by piece type (pawns have none)
+_PIECE_PREFIX = {piece_type: chess.piece_symbol(piece_type).upper() for piece_type in chess.PIECE_TYPES}
+_PIECE_PREFIX[PAWN] = ""
+
+
+def _attacks_from(piece_type: chess.PieceType, color: chess.Color, square: chess.Square, occupied: int) -> int:
+    """Squares attacked by a piece of the given type standing on square."""
+    if piece_type == PAWN:
+        return BB_PAWN_ATTACKS[color][square]
+    if piece_type == KNIGHT:
+        return BB_KNIGHT_ATTACKS[square]
+
+    attacks = 0
+    if piece_type in (BISHOP, QUEEN):
+        attacks |= BB_DIAG_ATTACKS[square][BB_DIAG_MASKS[square] & occupied]
+    if piece_type in (ROOK, QUEEN):
+        attacks |= BB_RANK_ATTACKS[square][BB_RANK_MASKS[square] & occupied]
+        attacks |= BB_FILE_ATTACKS[square][BB_FILE_MASKS[square] & occupied]
+    return attacks
+
+
+def legal_san_map(board: chess.Board) -> dict[chess.Move, str]:
+    """
+    Map every legal move to its SAN, identical to board.san(move).
+
+    Only meant for standard chess: variant-specific suffixes are not handled.
+    """
+    moves = list(board.legal_moves)
+    us = board.turn
+    king_square = board.king(not us)
+    king_mask = BB_SQUARES[king_square]
+    occupied = board.occupied
+
+    piece_types = [board.piece_type_at(move.from_square) for move in moves]
+
+    # (piece type, destination) -> origin squares, used for disambiguation
+    origins: dict[tuple[chess.PieceType, chess.Square], int] = {}
+    for move, piece_type in zip(moves, piece_types):
+        key = (piece_type, move.to_square)
+        origins[key] = origins.get(key, 0) | BB_SQUARES[move.from_square]
+
+    san_map = {}
+    for move, piece_type in zip(moves, piece_types):
+        from_mask = BB_SQUARES[move.from_square]
+
+        if piece_type == KING and board.is_castling(move):
+            if square_file(move.to_square) < square_file(move.from_square):
+                san = "O-O-O"
+            else:
+                san = "O-O"
+            # The rook gives any check here; let python-chess work it out
+            gives_check = None
+        else:
+            capture = board.is_capture(move)
+            san = _PIECE_PREFIX[piece_type]
+
+            if piece_type != PAWN:
+                others = origins[(piece_type, move.to_square)] & ~from_mask
+                if others:
+                    row, column = False, False
+
+                    if others & BB_RANKS[square_rank(move.from_square)]:
+                        column = True
+
+                    if others & BB_FILES[square_file(move.from_square)]:
+                        row = True
+                    else:
+                        column = True
+
+                    if column:
+                        san += FILE_NAMES[square_file(move.from_square)]
+                    if row:
+                        san += RANK_NAMES[square_rank(move.from_square)]
+            elif capture:
+                san += FILE_NAMES[square_file(move.from_square)]
+
+            if capture:
+                san += "x"
+
+            san += SQUARE_NAMES[move.to_square]
+
+            if move.promotion:
+                san += "=" + _PIECE_PREFIX[move.promotion]
+
+            # Occupancy after the move; en passant also removes the captured pawn
+            occupied_after = (occupied & ~from_mask) | BB_SQUARES[move.to_square]
+            if piece_type == PAWN and board.is_en_passant(move):
+                occupied_after &= ~BB_SQUARES[move.to_square + (-8 if us else 8)]
+
+            # The side to move never attacks the enemy king before moving, so a check
+            # is either direct (from the moved piece) or discovered (a slider whose
+            # line the move opened)
+            gives_check = bool(
+                _attacks_from(move.promotion or piece_type, us, move.to_square, occupied_after) & king_mask
+                or board.attackers_mask(us, king_square, occupied_after) & ~from_mask
+            )
+
+        if gives_check is None or gives_check:
+            board.push(move)
+            try:
+                if board.is_check():
+                    san += "#" if board.is_checkmate() else "+"
+            finally:
+                board.pop()
+
+        san_map[move] = san
+
+    return san_map
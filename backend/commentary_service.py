@@ -3,11 +3,10 @@ ElevenLabs-powered commentary service for generating audio from text.
 """
 import os
 import base64
-import asyncio
 import logging
 from typing import Optional
 
-import requests
+import httpx
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -27,6 +26,18 @@ class CommentaryService:
         self.voice_id = os.getenv("ELEVENLABS_VOICE_ID", "pNInz6obpgDQGcFmaJgB")
         self.enabled = bool(self.api_key)
 
+        # Shared HTTP/2 client so every synthesis call reuses a warm connection
+        # instead of paying a fresh TCP + TLS handshake per move
+        self._client = httpx.AsyncClient(
+            http2=True,
+            timeout=15.0,
+            limits=httpx.Limits(max_keepalive_connections=20, max_connections=100),
+            headers={
+                "xi-api-key": self.api_key or "",
+                "Content-Type": "application/json"
+            },
+        )
+
         if self.enabled:
             logger.info(f"CommentaryService enabled with voice_id: {self.voice_id}")
         else:
@@ -45,21 +56,12 @@ class CommentaryService:
         if not self.enabled or not text:
             return None
 
-        # Run blocking HTTP request in executor
-        loop = asyncio.get_running_loop()
-        return await loop.run_in_executor(None, self._blocking_synthesize, text)
-
-    def _blocking_synthesize(self, text: str) -> Optional[str]:
-        """Synchronous audio synthesis using ElevenLabs API."""
         try:
-            url = f"https://api.elevenlabs.io/v1/text-to-speech/{self.voice_id}"
-            headers = {
-                "xi-api-key": self.api_key,
-                "Content-Type": "application/json"
-            }
+            url = f"https://api.elevenlabs.io/v1/text-to-speech/{self.voice_id}/stream"
+            params = {"optimize_streaming_latency": 3}
             payload = {
                 "text": text,
-                "model_id": "eleven_monolingual_v1",
+                "model_id": "eleven_flash_v2_5",
                 "voice_settings": {
                     "stability": 0.35,
                     "similarity_boost": 0.8,
@@ -68,14 +70,28 @@ class CommentaryService:
                 }
             }
 
-            response = requests.post(url, headers=headers, json=payload, timeout=15)
-            response.raise_for_status()
-            audio_bytes = response.content
-            return base64.b64encode(audio_bytes).decode("utf-8")
+            # Encode chunks as they arrive; only whole 3-byte groups are encoded
+            # so the concatenated parts form one valid base64 string
+            encoded_parts: list[bytes] = []
+            pending = bytearray()
+            async with self._client.stream("POST", url, params=params, json=payload) as response:
+                response.raise_for_status()
+                async for chunk in response.aiter_bytes():
+                    pending.extend(chunk)
+                    cut = len(pending) - len(pending) % 3
+                    if cut:
+                        encoded_parts.append(base64.b64encode(pending[:cut]))
+                        del pending[:cut]
+            encoded_parts.append(base64.b64encode(pending))
+            return b"".join(encoded_parts).decode("ascii")
         except Exception as e:
             logger.error(f"Commentary audio generation failed: {e}")
             return None
 
+    async def aclose(self) -> None:
+        """Close the underlying HTTP client and its pooled connections."""
+        await self._client.aclose()
+
 
 # Singleton instance
 commentary_service = CommentaryService()
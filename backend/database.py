@@ -1,12 +1,41 @@
+import os
+
+from dotenv import load_dotenv
+from sqlalchemy import event
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine, async_sessionmaker
 from sqlalchemy.orm import DeclarativeBase
 
-DATABASE_URL = "sqlite+aiosqlite:///./vibechess.db"
+load_dotenv()
+
+# SQLite by default; set e.g. postgresql+asyncpg://... (with asyncpg installed) to let
+# concurrent games commit in parallel instead of queueing on SQLite's single writer
+DATABASE_URL = os.getenv("DATABASE_URL", "sqlite+aiosqlite:///./vibechess.db")
+IS_SQLITE = DATABASE_URL.startswith("sqlite")
+
+if IS_SQLITE:
+    # timeout: wait up to 30 s for the write lock instead of failing when games
+    # commit at the same time
+    engine = create_async_engine(DATABASE_URL, echo=False, connect_args={"timeout": 30})
+else:
+    engine = create_async_engine(
+        DATABASE_URL, echo=False, pool_size=20, max_overflow=10, pool_pre_ping=True
+    )
 
-engine = create_async_engine(DATABASE_URL, echo=False)
 async_session = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
 
 
+if IS_SQLITE:
+    @event.listens_for(engine.sync_engine, "connect")
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        """Use WAL journaling so commits don't fsync the whole database every time."""
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.execute("PRAGMA temp_store=MEMORY")
+        cursor.execute("PRAGMA cache_size=-64000")  # 64 MiB page cache
+        cursor.close()
+
+
 class Base(DeclarativeBase):
     pass
 
@@ -3,25 +3,65 @@ import asyncio
 import random
 import re
 import logging
-from typing import List, Tuple, Optional
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable
 import chess
+import msgspec
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, func
+from sqlalchemy import select
 from sqlalchemy.orm import selectinload
 
+from database import async_session
 from models import Game, Move, GameStatus, Color
-from schemas import MoveEvent, GameOverEvent, GameStartedEvent
+from schemas import MoveEvent, MoveDeltaEvent, CommentaryAudioEvent, GameOverEvent, GameStartedEvent
 from sse_manager import sse_manager
-from llm_service import call_claude_cli, build_chess_prompt, build_system_prompt, parse_chess_response
+from llm_service import create_session, llm_dispatcher, make_prompt_builder, build_system_prompt, parse_chess_response
 from commentary_service import commentary_service
+from chess_fast import legal_san_map
 
 logger = logging.getLogger(__name__)
 
+# Response patterns, compiled once at import
+_MOVE_RE = re.compile(r'MOVE:\s*([A-Za-z0-9\-+#=xO]+)', re.IGNORECASE)
+_COMMENT_RE = re.compile(r'COMMENT:\s*(.+?)(?:\n|$)', re.IGNORECASE | re.DOTALL)
+_TOKEN_SPLIT_RE = re.compile(r'[\s,;:.!?()\[\]"\'`*]+')
+_POTENTIAL_MOVE_RE = re.compile(r'\b([KQRBN]?[a-h]?[1-8]?x?[a-h][1-8](?:=[QRBN])?[+#]?|O-O(?:-O)?)\b')
 
-def parse_llm_response(response_text: str) -> tuple[str | None, str | None]:
+# Move rows are committed every COMMIT_BATCH_SIZE half-moves; anything left over is
+# flushed when the loop pauses or the game ends
+COMMIT_BATCH_SIZE = 2
+
+# game_code -> running game loop task, so a game never has two loops at once
+_game_tasks: dict[str, asyncio.Task] = {}
+
+# Games asked to run again while their loop was still winding down (e.g. a viewer
+# claimed the resume right after the loop committed its pause); relaunched once
+# that loop exits
+_restart_requested: set[str] = set()
+
+# python-chess is pure Python; heavier board work runs here so one game's move
+# generation doesn't stall SSE and HTTP handling for every other game
+_chess_pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix="chess")
+
+
+async def run_board_op(func: Callable[..., Any], *args: Any) -> Any:
+    """Run a python-chess computation on the chess thread pool, off the event loop."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_chess_pool, func, *args)
+
+
+def parse_llm_response(
+    response_text: str,
+    legal_sans: set[str] | None = None
+) -> tuple[str | None, str | None]:
     """
     Parse the LLM response to extract move and comment.
 
+    Args:
+        response_text: Raw text of the LLM reply
+        legal_sans: SAN of every legal move; when given, a reply without a MOVE: line
+            is first scanned for any token that is a legal move
+
     Returns:
         (move, comment) tuple. Move may be None if parsing fails.
     """
@@ -29,44 +69,73 @@ def parse_llm_response(response_text: str) -> tuple[str | None, str | None]:
     comment = None
 
     # Try to find MOVE: pattern
-    move_match = re.search(r'MOVE:\s*([A-Za-z0-9\-+#=xO]+)', response_text, re.IGNORECASE)
+    move_match = _MOVE_RE.search(response_text)
     if move_match:
         move = move_match.group(1).strip()
 
     # Try to find COMMENT: pattern
-    comment_match = re.search(r'COMMENT:\s*(.+?)(?:\n|$)', response_text, re.IGNORECASE | re.DOTALL)
+    comment_match = _COMMENT_RE.search(response_text)
     if comment_match:
         comment = comment_match.group(1).strip()
 
-    # If no structured format, try to extract just the first word that looks like a move
+    # If no structured format, look for the first token that is a legal move -
+    # a plain set lookup per token, cheaper and more accurate than the pattern below
+    if not move and legal_sans:
+        for token in _TOKEN_SPLIT_RE.split(response_text):
+            if token in legal_sans:
+                move = token
+                break
+
+    # Otherwise try to extract just the first word that looks like a move
     if not move:
         # Common chess move patterns
-        potential_moves = re.findall(r'\b([KQRBN]?[a-h]?[1-8]?x?[a-h][1-8](?:=[QRBN])?[+#]?|O-O(?:-O)?)\b', response_text)
+        potential_moves = _POTENTIAL_MOVE_RE.findall(response_text)
         if potential_moves:
             move = potential_moves[0]
 
     return move, comment
 
 
-def get_legal_moves_san(board: chess.Board) -> List[str]:
-    """Get all legal moves in SAN notation."""
-    return [board.san(move) for move in board.legal_moves]
+def get_legal_moves_san(board: chess.Board) -> dict[chess.Move, str]:
+    """Get all legal moves mapped to their SAN notation."""
+    return legal_san_map(board)
 
 
-def validate_and_get_move(board: chess.Board, move_str: str | None) -> chess.Move | None:
+def validate_and_get_move(
+    board: chess.Board,
+    move_str: str | None,
+    san_map: dict[chess.Move, str] | None = None
+) -> chess.Move | None:
     """
     Validate a move string and return the chess.Move object.
 
+    When the legal-move SAN map is given, the move is looked up there first
+    (tolerating a wrong check suffix or capitalization as long as the match is
+    unique), so the common case never goes through python-chess's exception path.
+
     Returns None if the move is invalid.
     """
     if not move_str:
         return None
 
+    if san_map:
+        san_to_move = {san: move for move, san in san_map.items()}
+        move = san_to_move.get(move_str)
+        if move is not None:
+            return move
+
+        bare = move_str.rstrip("+#").lower()
+        matches = [move for san, move in san_to_move.items() if san.rstrip("+#").lower() == bare]
+        if len(matches) == 1:
+            return matches[0]
+
     try:
         # Try parsing as SAN first
         return board.parse_san(move_str)
     except chess.InvalidMoveError:
         pass
+    except chess.IllegalMoveError:
+        pass
     except chess.AmbiguousMoveError:
         pass
 
@@ -75,6 +144,8 @@ def validate_and_get_move(board: chess.Board, move_str: str | None) -> chess.Mov
         return board.parse_uci(move_str)
     except chess.InvalidMoveError:
         pass
+    except chess.IllegalMoveError:
+        pass
 
     return None
 
@@ -116,6 +187,17 @@ def get_game_result(board: chess.Board) -> tuple[str, str]:
     return result, termination
 
 
+async def publish_commentary_audio(game_code: str, move_event: MoveEvent) -> None:
+    """Synthesize a move's commentary (if any) and broadcast it as a follow-up event."""
+    if not move_event.commentary:
+        return
+    audio = await commentary_service.generate_audio(move_event.commentary)
+    if audio:
+        await sse_manager.broadcast(game_code, CommentaryAudioEvent(
+            move_number=move_event.move_number, color=move_event.color, audio=audio
+        ))
+
+
 async def run_game(game_code: str, db: AsyncSession) -> None:
     """
     Run the main game loop for a chess game.
@@ -147,12 +229,8 @@ async def run_game(game_code: str, db: AsyncSession) -> None:
     game.is_paused = False
     await db.commit()
 
-    # Get current move number from existing moves
-    move_count_result = await db.execute(
-        select(func.count(Move.id)).where(Move.game_code == game_code)
-    )
-    existing_moves = move_count_result.scalar() or 0
-    move_number = existing_moves // 2 + 1
+    # Current move number comes straight from the FEN's fullmove counter
+    move_number = board.fullmove_number
 
     # Wait for at least one SSE subscriber to connect before starting
     # Poll every 100ms for up to 10 seconds
@@ -168,125 +246,227 @@ async def run_game(game_code: str, db: AsyncSession) -> None:
         await db.commit()
         return
 
-    while not board.is_game_over():
-        # Exit if no viewers - mark as paused so it can be resumed later
-        if sse_manager.get_subscriber_count(game_code) == 0:
-            logger.info(f"Game {game_code}: All viewers disconnected, pausing game loop")
-            game.is_paused = True
-            await db.commit()
-            return  # Exit entirely - will be resumed when someone reconnects
-
-        current_color = Color.WHITE if board.turn else Color.BLACK
-        is_white = current_color == Color.WHITE
-
-        # Get the right prompt and session
-        user_strategy = game.white_prompt if is_white else game.black_prompt
-        session_id = game.white_session_id if is_white else game.black_session_id
-
-        # Build prompt for LLM
-        prompt = build_chess_prompt(
-            color=current_color.value,
-            user_strategy=user_strategy,
-            board_ascii=str(board),
-            legal_moves=get_legal_moves_san(board)
-        )
-
-        # Call Claude CLI
-        if session_id:
-            llm_response = await call_claude_cli(prompt, session_id=session_id)
-        else:
-            # First move for this color - include system prompt
-            system_prompt = build_system_prompt(current_color.value)
-            llm_response = await call_claude_cli(prompt, system_prompt=system_prompt)
-
-        # Update session ID if we got a new one
-        if llm_response.session_id:
-            if is_white:
-                game.white_session_id = llm_response.session_id
-            else:
-                game.black_session_id = llm_response.session_id
-
-        # Parse LLM response using new parser
-        parsed = parse_chess_response(llm_response.text)
-        move_str = parsed.move
-        comment = parsed.comment
-        commentary = parsed.commentary
-        my_emotion = parsed.my_emotion
-        opponent_emotion = parsed.opponent_emotion
-
-        # Validate move
-        move = validate_and_get_move(board, move_str)
-        was_fallback = False
-
-        if move is None:
-            logger.warning(f"Invalid move from LLM: '{move_str}', using random fallback")
-            move = get_random_legal_move(board)
-            was_fallback = True
-            if comment:
-                comment = f"[FALLBACK - LLM suggested invalid move '{move_str}'] {comment}"
-            else:
-                comment = f"[FALLBACK - LLM suggested invalid move '{move_str}']"
-
-        # Get SAN before pushing (board state changes after push)
-        move_san = board.san(move)
-        move_uci = move.uci()
-
-        # Apply move
-        board.push(move)
-
-        # Update game state
-        game.board_fen = board.fen()
-        game.current_turn = Color.BLACK if is_white else Color.WHITE
-
-        # Record move in database
-        db_move = Move(
-            game_code=game_code,
-            move_number=move_number,
-            color=current_color,
-            move_uci=move_uci,
-            move_san=move_san,
-            comment=comment,
-            was_fallback=was_fallback
-        )
-        db.add(db_move)
+    # Commentary audio for the previous move is synthesized in the background so it
+    # overlaps with the next LLM call instead of delaying it
+    pending_publish: asyncio.Task | None = None
+
+    # One session per color for the whole run: a long-lived Claude CLI process (each
+    # turn is a write to its stdin instead of a process spawn + session load), or
+    # direct API calls when ANTHROPIC_API_KEY is set
+    sessions = {
+        Color.WHITE: create_session(
+            session_id=game.white_session_id,
+            system_prompt=build_system_prompt(Color.WHITE.value)
+        ),
+        Color.BLACK: create_session(
+            session_id=game.black_session_id,
+            system_prompt=build_system_prompt(Color.BLACK.value)
+        ),
+    }
+
+    # Color and strategy don't change during a game, so each player's prompt is
+    # specialized once and only the board and legal moves are filled in per turn
+    prompt_builders = {
+        Color.WHITE: make_prompt_builder(Color.WHITE.value, game.white_prompt),
+        Color.BLACK: make_prompt_builder(Color.BLACK.value, game.black_prompt),
+    }
+
+    uncommitted_moves = 0
+    # Batch commits run in the background while the next turn's LLM call is in
+    # flight; the session must not be modified again until the commit finishes
+    pending_commit: asyncio.Task | None = None
+
+    # Rendered once per position and reused by the prompt, game row and move event
+    board_ascii = await run_board_op(str, board)
+
+    try:
+        while not board.is_game_over():
+            # Exit if no viewers - mark as paused so it can be resumed later
+            if sse_manager.get_subscriber_count(game_code) == 0:
+                logger.info(f"Game {game_code}: All viewers disconnected, pausing game loop")
+                if pending_commit:
+                    await pending_commit
+                game.is_paused = True
+                await db.commit()
+                if pending_publish:
+                    await pending_publish
+                return  # Exit entirely - will be resumed when someone reconnects
+
+            current_color = Color.WHITE if board.turn else Color.BLACK
+            is_white = current_color == Color.WHITE
+
+            # SAN for every legal move, computed once and reused for the chosen move
+            san_map = await run_board_op(get_legal_moves_san, board)
+
+            # Build prompt for LLM
+            prompt = prompt_builders[current_color](board_ascii, list(san_map.values()))
+
+            # Call Claude through this color's long-lived CLI process; the shared
+            # dispatcher caps how many turns run at once across all games. Reply text
+            # is forwarded to viewers as it streams in.
+            async def forward_delta(text: msgspec.Raw, color: Color = current_color) -> None:
+                await sse_manager.broadcast(game_code, MoveDeltaEvent(color=color, text=text))
+
+            llm_response = await llm_dispatcher.submit(sessions[current_color], prompt, forward_delta)
+
+            if pending_commit:
+                await pending_commit
+                pending_commit = None
+
+            # Update session ID if we got a new one
+            if llm_response.session_id:
+                if is_white:
+                    game.white_session_id = llm_response.session_id
+                else:
+                    game.black_session_id = llm_response.session_id
+
+            # Parse LLM response using new parser
+            parsed = parse_chess_response(llm_response.text)
+            move_str = parsed.move
+            if move_str is None:
+                # No MOVE: line - recover a legal move mentioned anywhere in the reply
+                move_str, _ = parse_llm_response(llm_response.text, set(san_map.values()))
+            comment = parsed.comment
+            commentary = parsed.commentary
+            my_emotion = parsed.my_emotion
+            opponent_emotion = parsed.opponent_emotion
+
+            # Validate move
+            move = validate_and_get_move(board, move_str, san_map)
+            was_fallback = False
+
+            if move is None:
+                logger.warning(f"Invalid move from LLM: '{move_str}', using random fallback")
+                move = get_random_legal_move(board)
+                was_fallback = True
+                if comment:
+                    comment = f"[FALLBACK - LLM suggested invalid move '{move_str}'] {comment}"
+                else:
+                    comment = f"[FALLBACK - LLM suggested invalid move '{move_str}']"
+
+            # Get SAN before pushing (board state changes after push)
+            move_san = san_map.get(move) or board.san(move)
+            move_uci = move.uci()
+
+            # Apply move - the SAN map is stale from here on
+            board.push(move)
+            del san_map
+            board_fen, board_ascii = await run_board_op(lambda: (board.fen(), str(board)))
+
+            # Update game state
+            game.board_fen = board_fen
+            game.current_turn = Color.BLACK if is_white else Color.WHITE
+
+            # Record move in database
+            db_move = Move(
+                game_code=game_code,
+                move_number=move_number,
+                color=current_color,
+                move_uci=move_uci,
+                move_san=move_san,
+                comment=comment,
+                was_fallback=was_fallback
+            )
+            db.add(db_move)
+
+            # Broadcast the move right away, ahead of the next turn's move_delta events
+            move_event = MoveEvent(
+                move_number=move_number,
+                color=current_color,
+                move_uci=move_uci,
+                move_san=move_san,
+                comment=comment,
+                was_fallback=was_fallback,
+                board_fen=board_fen,
+                board_ascii=board_ascii,
+                commentary=commentary,
+                my_emotion=my_emotion,
+                opponent_emotion=opponent_emotion
+            )
+            await sse_manager.broadcast(game_code, move_event)
+
+            # Audio follows as its own event; keep clips in order by letting the
+            # previous one finish first
+            if pending_publish:
+                await pending_publish
+            pending_publish = asyncio.create_task(publish_commentary_audio(game_code, move_event))
+
+            # Viewers already have the move; persist it with the next batch
+            uncommitted_moves += 1
+            if uncommitted_moves >= COMMIT_BATCH_SIZE:
+                pending_commit = asyncio.create_task(db.commit())
+                uncommitted_moves = 0
+
+            # Increment move number after black's turn
+            if not is_white:
+                move_number += 1
+
+            logger.info(f"Game {game_code}: {current_color.value} played {move_san}")
+
+        if pending_publish:
+            await pending_publish
+        if pending_commit:
+            await pending_commit
+
+        # Game over
+        result, termination = get_game_result(board)
+        game.status = GameStatus.COMPLETED
+        game.result = result
         await db.commit()
 
-        # Generate commentary audio if available
-        commentary_audio = None
-        if commentary:
-            commentary_audio = await commentary_service.generate_audio(commentary)
-
-        # Broadcast move event
-        move_event = MoveEvent(
-            move_number=move_number,
-            color=current_color,
-            move_uci=move_uci,
-            move_san=move_san,
-            comment=comment,
-            was_fallback=was_fallback,
-            board_fen=board.fen(),
-            board_ascii=str(board),
-            commentary=commentary,
-            commentary_audio=commentary_audio,
-            my_emotion=my_emotion,
-            opponent_emotion=opponent_emotion
-        )
-        await sse_manager.broadcast(game_code, move_event)
-
-        # Increment move number after black's turn
-        if not is_white:
-            move_number += 1
-
-        logger.info(f"Game {game_code}: {current_color.value} played {move_san}")
-
-    # Game over
-    result, termination = get_game_result(board)
-    game.status = GameStatus.COMPLETED
-    game.result = result
-    await db.commit()
+        # Broadcast game over event
+        game_over_event = GameOverEvent(result=result, termination=termination)
+        await sse_manager.broadcast(game_code, game_over_event)
+
+        logger.info(f"Game {game_code} completed: {result} by {termination}")
+    finally:
+        try:
+            # Shut the CLI processes down first so a failed commit below can't leak them
+            await asyncio.gather(
+                *(session.close() for session in sessions.values()), return_exceptions=True
+            )
+        finally:
+            # Normal exits have already awaited the publish; on the error path it is
+            # dropped rather than left running without an owner
+            if pending_publish and not pending_publish.done():
+                pending_publish.cancel()
+            if pending_commit:
+                await pending_commit
+
+
+def ensure_game_running(game_code: str) -> bool:
+    """
+    Start the game loop for a game unless one is already running.
 
-    # Broadcast game over event
-    game_over_event = GameOverEvent(result=result, termination=termination)
-    await sse_manager.broadcast(game_code, game_over_event)
+    The loop runs as a process-wide task with its own database session, so it is
+    not tied to the request that triggered it.
 
-    logger.info(f"Game {game_code} completed: {result} by {termination}")
+    A loop that is still running may already be on its way out after pausing, so
+    the request is remembered and the game restarted as soon as that loop exits.
+
+    Returns:
+        True if a new game loop was started
+    """
+    task = _game_tasks.get(game_code)
+    if task is not None and not task.done():
+        _restart_requested.add(game_code)
+        return False
+
+    async def play() -> None:
+        async with async_session() as session:
+            await run_game(game_code, session)
+
+    def on_done(finished: asyncio.Task) -> None:
+        if _game_tasks.get(game_code) is finished:
+            del _game_tasks[game_code]
+        if not finished.cancelled() and finished.exception():
+            logger.error(f"Game {game_code}: game loop crashed", exc_info=finished.exception())
+        if game_code in _restart_requested:
+            _restart_requested.discard(game_code)
+            if not finished.cancelled():
+                ensure_game_running(game_code)
+
+    task = asyncio.create_task(play())
+    task.add_done_callback(on_done)
+    _game_tasks[game_code] = task
+    return True
@@ -1,15 +1,28 @@
 from __future__ import annotations
 import asyncio
-import json
 import logging
+import os
 import re
+import uuid
+from collections import OrderedDict
 from dataclasses import dataclass
-from typing import List, Optional
+from typing import Awaitable, Callable, List, Optional, Union
+
+import anthropic
+import msgspec
+from dotenv import load_dotenv
+
+load_dotenv()
 
 logger = logging.getLogger(__name__)
 
+# With an API key, players talk to the Messages API in-process instead of through
+# the Claude Code CLI
+ANTHROPIC_API_KEY = os.getenv("ANTHROPIC_API_KEY")
+ANTHROPIC_MODEL = os.getenv("ANTHROPIC_MODEL", "claude-haiku-4-5")
+
 # Valid emotion keys
-VALID_EMOTIONS = [
+VALID_EMOTIONS: frozenset[str] = frozenset({
     "grandmaster_trance",
     "instant_regret",
     "smug_trap_setter",
@@ -19,7 +32,14 @@ VALID_EMOTIONS = [
     "resigned_king",
     "impatient_speedster",
     "eureka_moment"
-]
+})
+
+# Response field patterns, compiled once at import
+_MOVE_RE = re.compile(r"MOVE:\s*(.+?)(?:\n|$)", re.IGNORECASE)
+_COMMENT_RE = re.compile(r"COMMENT:\s*(.+?)(?:\n(?:COMMENTARY|MY_EMOTION|OPPONENT_EMOTION):|$)", re.IGNORECASE)
+_COMMENTARY_RE = re.compile(r"COMMENTARY:\s*(.+?)(?:\n(?:MY_EMOTION|OPPONENT_EMOTION):|$)", re.IGNORECASE)
+_MY_EMOTION_RE = re.compile(r"MY_EMOTION:\s*(\S+)", re.IGNORECASE)
+_OPP_EMOTION_RE = re.compile(r"OPPONENT_EMOTION:\s*(\S+)", re.IGNORECASE)
 
 
 @dataclass
@@ -30,6 +50,35 @@ class LLMResponse:
     error: str | None = None
 
 
+# Claude CLI stream-json output, declared down to just the fields we read so
+# decoding skips everything else (tool lists, full assistant messages) without
+# building it
+class _StreamDelta(msgspec.Struct):
+    type: str = ""
+    # Left as the encoded JSON string so it can be forwarded without a round trip
+    text: msgspec.Raw = msgspec.Raw(b'""')
+
+
+class _StreamEvent(msgspec.Struct):
+    type: str = ""
+    delta: Optional[_StreamDelta] = None
+
+
+class _StreamLine(msgspec.Struct):
+    """One line of `--output-format stream-json` output."""
+    type: str = ""
+    subtype: Optional[str] = None
+    session_id: Optional[str] = None
+    is_error: Optional[bool] = None
+    result: Optional[str] = None
+    event: Optional[_StreamEvent] = None
+
+
+# Codecs are built once and shared by every session
+_STREAM_DECODER = msgspec.json.Decoder(_StreamLine)
+_ENCODER = msgspec.json.Encoder()
+
+
 @dataclass
 class ChessMoveResponse:
     """Parsed chess move response from LLM."""
@@ -42,22 +91,22 @@ class ChessMoveResponse:
 
 def parse_chess_response(text: str) -> ChessMoveResponse:
     """Parse the LLM response to extract all chess move fields."""
-    def extract_field(pattern: str, text: str) -> Optional[str]:
-        match = re.search(pattern, text, re.IGNORECASE)
+    def extract_field(pattern: re.Pattern[str], text: str) -> Optional[str]:
+        match = pattern.search(text)
         return match.group(1).strip() if match else None
 
-    move = extract_field(r"MOVE:\s*(.+?)(?:\n|$)", text)
-    comment = extract_field(r"COMMENT:\s*(.+?)(?:\n(?:COMMENTARY|MY_EMOTION|OPPONENT_EMOTION):|$)", text)
-    commentary = extract_field(r"COMMENTARY:\s*(.+?)(?:\n(?:MY_EMOTION|OPPONENT_EMOTION):|$)", text)
-    my_emotion = extract_field(r"MY_EMOTION:\s*(\S+)", text)
-    opponent_emotion = extract_field(r"OPPONENT_EMOTION:\s*(\S+)", text)
+    move = extract_field(_MOVE_RE, text)
+    comment = extract_field(_COMMENT_RE, text)
+    commentary = extract_field(_COMMENTARY_RE, text)
+    my_emotion = extract_field(_MY_EMOTION_RE, text)
+    opponent_emotion = extract_field(_OPP_EMOTION_RE, text)
 
     # Validate emotions
     if my_emotion and my_emotion not in VALID_EMOTIONS:
-        logger.warning(f"Invalid my_emotion: {my_emotion}, defaulting to stone_wall")
+        logger.warning("Invalid my_emotion: %s, defaulting to stone_wall", my_emotion)
         my_emotion = "stone_wall"
     if opponent_emotion and opponent_emotion not in VALID_EMOTIONS:
-        logger.warning(f"Invalid opponent_emotion: {opponent_emotion}, defaulting to stone_wall")
+        logger.warning("Invalid opponent_emotion: %s, defaulting to stone_wall", opponent_emotion)
         opponent_emotion = "stone_wall"
 
     return ChessMoveResponse(
@@ -69,81 +118,316 @@ def parse_chess_response(text: str) -> ChessMoveResponse:
     )
 
 
-async def call_claude_cli(
-    prompt: str,
-    session_id: str | None = None,
-    system_prompt: str | None = None
-) -> LLMResponse:
-    """
-    Call Claude Code CLI with a prompt.
+# Receives reply text chunks as they stream in, each still encoded as a JSON string
+# literal so it can be spliced into an SSE event without being re-escaped
+TextCallback = Callable[[msgspec.Raw], Awaitable[None]]
 
-    Args:
-        prompt: The prompt to send to Claude
-        session_id: Optional session ID to resume a conversation
-        system_prompt: Optional system prompt for first message in session
 
-    Returns:
-        LLMResponse with the text response and session ID
+class ClaudeSession:
     """
-    cmd = ["claude", "-p", prompt, "--output-format", "json", "--model", "haiku"]
-
-    if session_id:
-        cmd.extend(["--resume", session_id])
-    elif system_prompt:
-        cmd.extend(["--system-prompt", system_prompt])
+    Long-lived Claude Code CLI process for one player.
 
-    logger.info(f"Calling Claude CLI: {' '.join(cmd[:4])}...")
+    The CLI runs in stream-json mode: each prompt is written to stdin as a single
+    JSON line and stdout is read until the turn's "result" message. This avoids
+    spawning a new process (and reloading the session from disk) on every move.
+    """
 
-    try:
-        process = await asyncio.create_subprocess_exec(
+    def __init__(self, session_id: str | None = None, system_prompt: str | None = None):
+        self.session_id = session_id
+        self.system_prompt = system_prompt
+        self._process: asyncio.subprocess.Process | None = None
+        # One turn at a time: replies are read off a single stdout stream
+        self._lock = asyncio.Lock()
+
+    async def _start(self) -> None:
+        """Spawn the CLI process, resuming the conversation if we already have one."""
+        cmd = [
+            "claude", "-p",
+            "--input-format", "stream-json",
+            "--output-format", "stream-json",
+            "--include-partial-messages",
+            "--verbose",
+            "--model", "haiku"
+        ]
+
+        if self.session_id:
+            cmd.extend(["--resume", self.session_id])
+        elif self.system_prompt:
+            cmd.extend(["--system-prompt", self.system_prompt])
+
+        if logger.isEnabledFor(logging.INFO):
+            logger.info("Starting Claude CLI session: %s...", " ".join(cmd[:6]))
+
+        self._process = await asyncio.create_subprocess_exec(
             *cmd,
+            stdin=asyncio.subprocess.PIPE,
             stdout=asyncio.subprocess.PIPE,
-            stderr=asyncio.subprocess.PIPE
+            stderr=asyncio.subprocess.DEVNULL,
+            limit=2 ** 20  # init messages can exceed the default 64 KiB line limit
         )
-        stdout, stderr = await process.communicate()
 
-        if process.returncode != 0:
-            error_msg = stderr.decode() if stderr else "Unknown error"
-            logger.error(f"Claude CLI error: {error_msg}")
-            return LLMResponse(text="", session_id=session_id, error=error_msg)
+    async def send(self, prompt: str, on_text: Optional[TextCallback] = None) -> LLMResponse:
+        """
+        Send a prompt to the session and wait for Claude's reply.
+
+        The process is (re)started on demand, so a crashed CLI is resumed
+        transparently on the next call.
 
-        response_text = stdout.decode()
+        Args:
+            prompt: The user message for this turn
+            on_text: Awaited with each chunk of reply text as Claude generates it,
+                as the JSON string literal the CLI printed
 
+        Returns:
+            LLMResponse with the text response and session ID
+        """
+        async with self._lock:
+            return await self._send(prompt, on_text)
+
+    async def _send(self, prompt: str, on_text: Optional[TextCallback]) -> LLMResponse:
+        try:
+            if self._process is None or self._process.returncode is not None:
+                await self._start()
+
+            message = {"type": "user", "message": {"role": "user", "content": prompt}}
+            self._process.stdin.write(_ENCODER.encode(message) + b"\n")
+            await self._process.stdin.drain()
+
+            async for line in self._process.stdout:
+                try:
+                    data = _STREAM_DECODER.decode(line)
+                except msgspec.DecodeError:
+                    logger.warning("Failed to parse Claude CLI stream line, skipping")
+                    continue
+
+                if data.session_id:
+                    self.session_id = data.session_id
+
+                if data.type == "stream_event":
+                    event = data.event
+                    if (
+                        on_text and event and event.delta
+                        and event.type == "content_block_delta" and event.delta.type == "text_delta"
+                    ):
+                        await on_text(event.delta.text)
+                    continue
+
+                if data.type == "result":
+                    if data.is_error:
+                        error_msg = data.result or data.subtype or "Unknown error"
+                        logger.error("Claude CLI error: %s", error_msg)
+                        return LLMResponse(text="", session_id=self.session_id, error=error_msg)
+                    return LLMResponse(text=data.result or "", session_id=self.session_id)
+
+            # stdout closed before a result arrived - the process died
+            returncode = await self._process.wait()
+            self._process = None
+            error_msg = f"Claude CLI exited unexpectedly with code {returncode}"
+            logger.error(error_msg)
+            return LLMResponse(text="", session_id=self.session_id, error=error_msg)
+
+        except asyncio.CancelledError:
+            # A half-read reply would be mistaken for the next turn's answer
+            if self._process is not None and self._process.returncode is None:
+                self._process.kill()
+            self._process = None
+            raise
+        except FileNotFoundError:
+            error_msg = "Claude CLI not found. Please install claude-code."
+            logger.error(error_msg)
+            return LLMResponse(text="", session_id=None, error=error_msg)
+        except Exception as e:
+            error_msg = f"Error calling Claude CLI: {str(e)}"
+            logger.error(error_msg)
+            await self.close()
+            return LLMResponse(text="", session_id=self.session_id, error=error_msg)
+
+    async def close(self) -> None:
+        """Shut down the CLI process."""
+        process, self._process = self._process, None
+        if process is None or process.returncode is not None:
+            return
+
+        process.stdin.close()
         try:
-            response_data = json.loads(response_text)
-            return LLMResponse(
-                text=response_data.get("result", ""),
-                session_id=response_data.get("session_id", session_id)
-            )
-        except json.JSONDecodeError:
-            # If JSON parsing fails, treat the whole output as text
-            logger.warning("Failed to parse Claude CLI JSON response, using raw text")
-            return LLMResponse(text=response_text, session_id=session_id)
-
-    except FileNotFoundError:
-        error_msg = "Claude CLI not found. Please install claude-code."
-        logger.error(error_msg)
-        return LLMResponse(text="", session_id=None, error=error_msg)
-    except Exception as e:
-        error_msg = f"Error calling Claude CLI: {str(e)}"
-        logger.error(error_msg)
-        return LLMResponse(text="", session_id=session_id, error=error_msg)
-
-
-def build_chess_prompt(
-    color: str,
-    user_strategy: str,
-    board_ascii: str,
-    legal_moves: List[str]
-) -> str:
-    """Build the prompt for asking Claude to make a chess move."""
-    return f"""You are playing chess as {color}.
-Your strategy: {user_strategy}
-
-Current board position:
-{board_ascii}
-
-Legal moves available: {', '.join(legal_moves)}
+            await asyncio.wait_for(process.wait(), timeout=5)
+        except asyncio.TimeoutError:
+            process.kill()
+            await process.wait()
+
+
+# Conversations of API-backed sessions, keyed by the session ID stored on the game.
+# Bounded so finished or abandoned games don't keep their transcripts forever.
+API_HISTORY_LIMIT = 256
+API_SESSION_PREFIX = "api-"
+_api_histories: OrderedDict[str, list[dict]] = OrderedDict()
+
+_anthropic_client: anthropic.AsyncAnthropic | None = (
+    anthropic.AsyncAnthropic(api_key=ANTHROPIC_API_KEY) if ANTHROPIC_API_KEY else None
+)
+
+
+class AnthropicSession:
+    """
+    Player session that calls the Anthropic Messages API directly.
+
+    Same interface as ClaudeSession, but each turn is one streamed HTTP request on
+    a pooled connection instead of a round-trip through a CLI process. The API is
+    stateless, so the conversation is kept in memory and resent every turn; the
+    session ID is the key into that history, which lets a resumed game continue
+    its conversation as long as this process still has it.
+    """
+
+    def __init__(self, session_id: str | None = None, system_prompt: str | None = None):
+        self.system_prompt = system_prompt
+        self._lock = asyncio.Lock()
+
+        if session_id in _api_histories:
+            _api_histories.move_to_end(session_id)
+        else:
+            # New game, a CLI session ID, or a history that has been evicted
+            session_id = f"{API_SESSION_PREFIX}{uuid.uuid4().hex}"
+            _api_histories[session_id] = []
+            while len(_api_histories) > API_HISTORY_LIMIT:
+                _api_histories.popitem(last=False)
+
+        self.session_id = session_id
+        self._messages = _api_histories[session_id]
+
+    async def send(self, prompt: str, on_text: Optional[TextCallback] = None) -> LLMResponse:
+        """
+        Send a prompt and wait for the reply, passing text chunks to on_text as
+        they stream in.
+
+        Returns:
+            LLMResponse with the text response and session ID
+        """
+        async with self._lock:
+            # Mark the newest turn for prompt caching so the resent history is
+            # read from cache instead of being processed again
+            latest = {
+                "role": "user",
+                "content": [{"type": "text", "text": prompt, "cache_control": {"type": "ephemeral"}}]
+            }
+
+            try:
+                async with _anthropic_client.messages.stream(
+                    model=ANTHROPIC_MODEL,
+                    max_tokens=1024,
+                    system=self.system_prompt or anthropic.NOT_GIVEN,
+                    messages=[*self._messages, latest],
+                ) as stream:
+                    async for text in stream.text_stream:
+                        if on_text:
+                            await on_text(msgspec.Raw(_ENCODER.encode(text)))
+                    message = await stream.get_final_message()
+                text = "".join(block.text for block in message.content if block.type == "text")
+            except Exception as e:
+                # Timeouts, dropped connections and malformed streams degrade to an
+                # error reply just like API errors, the same as ClaudeSession
+                error_msg = f"Error calling Anthropic API: {str(e)}"
+                logger.error(error_msg)
+                return LLMResponse(text="", session_id=self.session_id, error=error_msg)
+
+            if text:
+                # Empty assistant turns are rejected by the API, so only complete
+                # exchanges go into the history
+                self._messages.append({"role": "user", "content": prompt})
+                self._messages.append({"role": "assistant", "content": text})
+            return LLMResponse(text=text, session_id=self.session_id)
+
+    async def close(self) -> None:
+        """Nothing to shut down; the history stays cached for a later resume."""
+
+
+PlayerSession = Union[ClaudeSession, AnthropicSession]
+
+
+def create_session(session_id: str | None = None, system_prompt: str | None = None) -> PlayerSession:
+    """Create a player session on the API when a key is configured, otherwise on the CLI."""
+    if _anthropic_client is not None:
+        return AnthropicSession(session_id=session_id, system_prompt=system_prompt)
+
+    if session_id and session_id.startswith(API_SESSION_PREFIX):
+        # The CLI can't resume a conversation that only existed on the API
+        session_id = None
+    return ClaudeSession(session_id=session_id, system_prompt=system_prompt)
+
+
+class LLMDispatcher:
+    """
+    Shared queue that runs Claude turns on a fixed pool of worker coroutines.
+
+    Every game submits its turns here, so the number of Claude requests in flight
+    is capped at ``max_concurrent`` no matter how many games are running.
+    """
+
+    def __init__(self, max_concurrent: int = 8):
+        self.max_concurrent = max_concurrent
+        self._queue: asyncio.Queue[
+            tuple[PlayerSession, str, Optional[TextCallback], asyncio.Future]
+        ] = asyncio.Queue()
+        self._workers: list[asyncio.Task] = []
+
+    async def submit(
+        self,
+        session: PlayerSession,
+        prompt: str,
+        on_text: Optional[TextCallback] = None
+    ) -> LLMResponse:
+        """
+        Queue a prompt for a session and wait for its response.
+
+        The worker slot is held until the whole reply has streamed through on_text.
+        """
+        if not self._workers:
+            self._workers = [
+                asyncio.create_task(self._worker()) for _ in range(self.max_concurrent)
+            ]
+
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((session, prompt, on_text, future))
+        return await future
+
+    async def _worker(self) -> None:
+        while True:
+            session, prompt, on_text, future = await self._queue.get()
+            try:
+                if future.cancelled():
+                    continue
+                response = await session.send(prompt, on_text)
+                if not future.done():
+                    future.set_result(response)
+            except Exception as e:
+                if not future.done():
+                    future.set_exception(e)
+            finally:
+                self._queue.task_done()
+
+    async def aclose(self) -> None:
+        """Stop the worker pool and release the API client's connections."""
+        workers, self._workers = self._workers, []
+        for worker in workers:
+            worker.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
+
+        if _anthropic_client is not None:
+            await _anthropic_client.close()
+
+
+# Global dispatcher instance
+llm_dispatcher = LLMDispatcher()
+
+
+# Static pieces of the per-move prompt; make_prompt_builder joins them with the
+# parts that change every turn. This is already a pre-split template rendered by
+# a single C-level join, which a template engine's per-render context setup
+# can only add overhead to.
+_PROMPT_HEAD = "You are playing chess as "
+_PROMPT_STRATEGY = ".\nYour strategy: "
+_PROMPT_BOARD = "\n\nCurrent board position:\n"
+_PROMPT_MOVES = "\n\nLegal moves available: "
+_PROMPT_FOOTER = """
 
 Respond with your move in this exact format:
 MOVE: <move in SAN notation like e4, Nf3, O-O>
@@ -155,8 +439,32 @@ OPPONENT_EMOTION: <same options - your guess of how your opponent is feeling>
 IMPORTANT: Your MOVE must be one of the legal moves listed above."""
 
 
+def make_prompt_builder(color: str, user_strategy: str) -> Callable[[str, List[str]], str]:
+    """
+    Specialize the move prompt for one player.
+
+    Color and strategy are fixed for the whole game, so they are baked into the
+    prefix once and each turn only fills in the board and the legal moves.
+    """
+    prefix = "".join([_PROMPT_HEAD, color, _PROMPT_STRATEGY, user_strategy, _PROMPT_BOARD])
+
+    def build(board_ascii: str, legal_moves: List[str]) -> str:
+        return "".join([
+            prefix, board_ascii,
+            _PROMPT_MOVES, ", ".join(legal_moves),
+            _PROMPT_FOOTER
+        ])
+
+    return build
+
+
 def build_system_prompt(color: str) -> str:
     """Build the system prompt for a new chess game session."""
+    prompt = _SYSTEM_PROMPTS.get(color)
+    return prompt if prompt is not None else _render_system_prompt(color)
+
+
+def _render_system_prompt(color: str) -> str:
     return f"""You are a chess AI playing as {color}. You will be given the current board state and asked to make moves.
 
 Rules:
@@ -176,3 +484,7 @@ You will receive the board as ASCII art where:
 - Uppercase letters = White pieces (K=King, Q=Queen, R=Rook, B=Bishop, N=Knight, P=Pawn)
 - Lowercase letters = Black pieces
 - Dots (.) = Empty squares"""
+
+
+# Only two colors exist, so both system prompts are rendered once at import
+_SYSTEM_PROMPTS = {color: _render_system_prompt(color) for color in ("white", "black")}
@@ -3,14 +3,15 @@ import string
 import logging
 from contextlib import asynccontextmanager
 
-from fastapi import FastAPI, HTTPException, Depends, BackgroundTasks
+from fastapi import FastAPI, HTTPException, Depends, Header
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
+from sqlalchemy import select, update
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import selectinload
 
-from database import init_db, get_db, async_session
+from database import init_db, get_db
 from models import Game, GameStatus, Color
 from schemas import (
     CreateGameResponse,
@@ -20,7 +21,9 @@ from schemas import (
     PromptSubmittedEvent,
 )
 from sse_manager import sse_manager
-from game_engine import run_game
+from game_engine import ensure_game_running
+from commentary_service import commentary_service
+from llm_service import llm_dispatcher
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -29,10 +32,12 @@ logger = logging.getLogger(__name__)
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    """Initialize database on startup."""
+    """Initialize database on startup and release shared clients on shutdown."""
     await init_db()
     logger.info("Database initialized")
     yield
+    await llm_dispatcher.aclose()
+    await commentary_service.aclose()
 
 
 app = FastAPI(
@@ -67,16 +72,23 @@ async def root():
 @app.post("/games", response_model=CreateGameResponse)
 async def create_game(db: AsyncSession = Depends(get_db)):
     """Create a new game and return the game code for sharing."""
-    # Generate unique game code
-    while True:
+    # Insert directly: game_code is the primary key, so a collision shows up as an
+    # IntegrityError and we retry with a fresh code
+    for _ in range(5):
         game_code = generate_game_code()
-        existing = await db.execute(select(Game).where(Game.game_code == game_code))
-        if not existing.scalar_one_or_none():
+        db.add(Game(game_code=game_code))
+        try:
+            await db.commit()
             break
-
-    game = Game(game_code=game_code)
-    db.add(game)
-    await db.commit()
+        except IntegrityError:
+            await db.rollback()
+            # Only a taken code is worth retrying; any other constraint failure is a
+            # real error
+            if await db.get(Game, game_code) is None:
+                logger.exception(f"Failed to create game {game_code}")
+                raise
+    else:
+        raise HTTPException(status_code=503, detail="Could not allocate a game code")
 
     logger.info(f"Created new game: {game_code}")
     return CreateGameResponse(game_code=game_code)
@@ -86,7 +98,6 @@ async def create_game(db: AsyncSession = Depends(get_db)):
 async def submit_prompt(
     game_code: str,
     request: SubmitPromptRequest,
-    background_tasks: BackgroundTasks,
     db: AsyncSession = Depends(get_db),
 ):
     """Submit a prompt for a player (white or black)."""
@@ -123,12 +134,8 @@ async def submit_prompt(
     game_started = False
     if game.white_prompt is not None and game.black_prompt is not None:
         game_started = True
-        # Start the game in a background task
-        async def start_game():
-            async with async_session() as session:
-                await run_game(game_code, session)
-
-        background_tasks.add_task(start_game)
+        # Start the game loop as a process-wide task
+        ensure_game_running(game_code)
         logger.info(f"Game {game_code}: Both prompts submitted, starting game")
 
     return SubmitPromptResponse(
@@ -150,9 +157,6 @@ async def get_game(game_code: str, db: AsyncSession = Depends(get_db)):
     if not game:
         raise HTTPException(status_code=404, detail="Game not found")
 
-    # Sort moves by move_number and color
-    sorted_moves = sorted(game.moves, key=lambda m: (m.move_number, m.color != Color.WHITE))
-
     return GameResponse(
         game_code=game.game_code,
         status=game.status,
@@ -161,7 +165,7 @@ async def get_game(game_code: str, db: AsyncSession = Depends(get_db)):
         board_fen=game.board_fen,
         current_turn=game.current_turn,
         result=game.result,
-        moves=sorted_moves,
+        moves=game.moves,
         created_at=game.created_at
     )
 
@@ -169,42 +173,49 @@ async def get_game(game_code: str, db: AsyncSession = Depends(get_db)):
 @app.get("/games/{game_code}/events")
 async def game_events(
     game_code: str,
-    background_tasks: BackgroundTasks,
-    db: AsyncSession = Depends(get_db)
+    db: AsyncSession = Depends(get_db),
+    last_event_id: str | None = Header(None)
 ):
     """
     Server-Sent Events endpoint for real-time game updates.
 
     Subscribe to this endpoint to receive move events, game over events, etc.
+    New subscribers first get the game's recent events; a reconnecting
+    EventSource (Last-Event-ID) picks up after the last one it received. Either
+    backlog is wrapped in replay_start/replay_end events.
     If the game was paused (no viewers), this will resume it.
     """
-    # Verify game exists
-    result = await db.execute(select(Game).where(Game.game_code == game_code))
-    game = result.scalar_one_or_none()
+    # Verify game exists - only the flags needed for resuming, not the prompts
+    result = await db.execute(
+        select(Game.is_paused, Game.status).where(Game.game_code == game_code)
+    )
+    game = result.one_or_none()
 
     if not game:
         raise HTTPException(status_code=404, detail="Game not found")
 
     # Resume paused game when viewer connects
     if game.is_paused and game.status == GameStatus.IN_PROGRESS:
-        logger.info(f"Game {game_code}: Viewer connected, resuming paused game")
-        # Mark as not paused immediately to prevent duplicate restarts
-        game.is_paused = False
+        # Claim the resume atomically so simultaneous viewers can't both restart it
+        claim = await db.execute(
+            update(Game)
+            .where(
+                Game.game_code == game_code,
+                Game.is_paused.is_(True),
+                Game.status == GameStatus.IN_PROGRESS,
+            )
+            .values(is_paused=False)
+        )
         await db.commit()
 
-        # Restart the game loop
-        async def resume_game():
-            async with async_session() as session:
-                await run_game(game_code, session)
-
-        background_tasks.add_task(resume_game)
-
-    async def event_generator():
-        async for event in sse_manager.subscribe(game_code):
-            yield event
+        if claim.rowcount:
+            logger.info(f"Game {game_code}: Viewer connected, resuming paused game")
+            # Restart the game loop (no-op if one is already running)
+            ensure_game_running(game_code)
 
+    # subscribe() already yields encoded SSE frames, so they go straight to the socket
     return StreamingResponse(
-        event_generator(),
+        sse_manager.subscribe(game_code, last_event_id),
         media_type="text/event-stream",
         headers={
             "Cache-Control": "no-cache",
@@ -2,7 +2,7 @@ from __future__ import annotations
 import enum
 from datetime import datetime
 from typing import Optional, List
-from sqlalchemy import String, Text, Enum, Boolean, Integer, ForeignKey, DateTime
+from sqlalchemy import String, Text, Enum, Boolean, Integer, ForeignKey, DateTime, Index, func
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 from database import Base
 
@@ -36,16 +36,27 @@ class Game(Base):
     current_turn: Mapped[Color] = mapped_column(Enum(Color), default=Color.WHITE)
     result: Mapped[Optional[str]] = mapped_column(String(20), nullable=True)
     is_paused: Mapped[bool] = mapped_column(Boolean, default=False)
-    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    # default= puts CURRENT_TIMESTAMP in the INSERT itself, so tables created before
+    # the server defaults existed (NOT NULL, no default) still get a value
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime, default=func.now(), server_default=func.now()
+    )
     updated_at: Mapped[datetime] = mapped_column(
-        DateTime, default=datetime.utcnow, onupdate=datetime.utcnow
+        DateTime, default=func.now(), server_default=func.now(), onupdate=func.now()
     )
 
-    moves: Mapped[List["Move"]] = relationship(back_populates="game", cascade="all, delete-orphan")
+    # Moves are inserted in play order, so ordering by id yields
+    # (move_number, white before black) without sorting in Python
+    moves: Mapped[List["Move"]] = relationship(
+        back_populates="game", cascade="all, delete-orphan", order_by="Move.id"
+    )
 
 
 class Move(Base):
     __tablename__ = "moves"
+    __table_args__ = (
+        Index("ix_moves_game_num_color", "game_code", "move_number", "color"),
+    )
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
     game_code: Mapped[str] = mapped_column(ForeignKey("games.game_code"))
@@ -55,6 +66,8 @@ class Move(Base):
     move_san: Mapped[str] = mapped_column(String(10))
     comment: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
     was_fallback: Mapped[bool] = mapped_column(Boolean, default=False)
-    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime, default=func.now(), server_default=func.now()
+    )
 
     game: Mapped["Game"] = relationship(back_populates="moves")
@@ -1,6 +1,8 @@
 from __future__ import annotations
 from datetime import datetime
 from typing import Optional, List
+
+import msgspec
 from pydantic import BaseModel, Field
 from models import GameStatus, Color
 
@@ -50,7 +52,9 @@ class GameResponse(BaseModel):
 
 
 # SSE event schemas
-class MoveEvent(BaseModel):
+# Output-only, so they are msgspec Structs: no validation on construction and
+# msgspec.json encodes them straight to bytes
+class MoveEvent(msgspec.Struct, kw_only=True):
     type: str = "move"
     move_number: int
     color: Color
@@ -60,23 +64,37 @@ class MoveEvent(BaseModel):
     was_fallback: bool
     board_fen: str
     board_ascii: str
-    # Commentary fields
+    # Commentary fields (audio follows separately as a CommentaryAudioEvent)
     commentary: Optional[str] = None
-    commentary_audio: Optional[str] = None  # Base64 encoded audio
     my_emotion: Optional[str] = None
     opponent_emotion: Optional[str] = None
 
 
-class GameOverEvent(BaseModel):
+class MoveDeltaEvent(msgspec.Struct, kw_only=True):
+    """A chunk of Claude's reply, forwarded as it is generated."""
+    type: str = "move_delta"
+    color: Color
+    text: msgspec.Raw  # Encoded JSON string, passed through as the LLM backend produced it
+
+
+class CommentaryAudioEvent(msgspec.Struct, kw_only=True):
+    """Spoken commentary for a move, sent once synthesis finishes."""
+    type: str = "commentary_audio"
+    move_number: int
+    color: Color
+    audio: str  # Base64 encoded audio
+
+
+class GameOverEvent(msgspec.Struct, kw_only=True):
     type: str = "game_over"
     result: str
     termination: str
 
 
-class PromptSubmittedEvent(BaseModel):
+class PromptSubmittedEvent(msgspec.Struct, kw_only=True):
     type: str = "prompt_submitted"
     color: Color
 
 
-class GameStartedEvent(BaseModel):
+class GameStartedEvent(msgspec.Struct, kw_only=True):
     type: str = "game_started"
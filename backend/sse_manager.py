@@ -1,60 +1,236 @@
 from __future__ import annotations
 import asyncio
-import json
-from collections import defaultdict
+import itertools
+import logging
+import uuid
+from collections import OrderedDict, deque
 from typing import AsyncGenerator
+
+import msgspec
 from pydantic import BaseModel
 
+logger = logging.getLogger(__name__)
+
+# Writes kept in a game's channel. A subscriber that falls further behind than this
+# is considered stalled and dropped. Sized for a full turn of move_delta chunks
+# plus the move event itself.
+CHANNEL_BUFFER_SIZE = 256
+
+# Recent writes replayed to a newly connected subscriber so it sees how the game
+# got here instead of starting from silence
+REPLAY_WRITES = 64
+
+# Channels kept after their last subscriber leaves, so a viewer who reloads the page
+# still gets the game's recent events. The least recently left ones go first.
+IDLE_CHANNEL_LIMIT = 64
+
+# Broadcasts arriving within this window are delivered to subscribers as one write
+COALESCE_WINDOW = 0.005
+
+_SSE_PREFIX = b"data: "
+_SSE_SUFFIX = b"\n\n"
+
+# One encoder for every event, so its output buffer is reused across broadcasts
+_ENCODER = msgspec.json.Encoder()
+
+
+def encode_event(event: msgspec.Struct | BaseModel | dict) -> bytes:
+    """Serialize an event into a complete SSE frame."""
+    if isinstance(event, BaseModel):
+        event = event.model_dump()
+
+    # One join allocates the frame once instead of building an intermediate per +
+    return b"".join((_SSE_PREFIX, _ENCODER.encode(event), _SSE_SUFFIX))
+
+
+# Bracket the backlog sent on connect, so clients can apply it without reacting to
+# it live (autoplaying audio, refetching state per move). "resumed" tells whether it
+# continues the client's previous connection or is just recent history.
+_REPLAY_START = {
+    resumed: encode_event({"type": "replay_start", "resumed": resumed})
+    for resumed in (True, False)
+}
+_REPLAY_END = encode_event({"type": "replay_end"})
+
+
+class _Channel:
+    """
+    One game's broadcast log.
+
+    Publishing appends to a ring buffer and wakes every reader at once; each
+    subscriber keeps its own cursor into the log, so a broadcast costs the same
+    no matter how many viewers there are.
+    """
+
+    __slots__ = ("epoch", "frames", "version", "wakeup", "subscribers", "closed")
+
+    def __init__(self):
+        # Distinguishes this channel's event IDs from those of an earlier channel
+        # for the same game, whose versions also started at zero
+        self.epoch = uuid.uuid4().hex[:8]
+        self.frames: deque[bytes] = deque(maxlen=CHANNEL_BUFFER_SIZE)
+        # Number of writes ever published; frames[-1] is write version - 1
+        self.version = 0
+        self.wakeup = asyncio.Event()
+        self.subscribers = 0
+        self.closed = False
+
+    def publish(self, payload: bytes) -> None:
+        self.version += 1
+        # A data-less block only sets the client's last event ID, which EventSource
+        # sends back as Last-Event-ID when it reconnects
+        self.frames.append(b"".join((payload, b"id: %s-%d\n\n" % (self.epoch.encode(), self.version))))
+        self._wake()
+
+    def resume_cursor(self, last_event_id: str | None) -> int | None:
+        """Version right after the client's last write, if it is still buffered."""
+        if last_event_id:
+            epoch, _, version = last_event_id.partition("-")
+            if epoch == self.epoch and version.isdigit():
+                seen = int(version)
+                if self.version - len(self.frames) <= seen <= self.version:
+                    return seen
+        return None
+
+    def history_cursor(self) -> int:
+        """Version a new subscriber starts reading from to get recent history."""
+        return self.version - min(len(self.frames), REPLAY_WRITES)
+
+    def close(self) -> None:
+        self.closed = True
+        self._wake()
+
+    def _wake(self) -> None:
+        # Swap in a fresh Event so readers woken now wait for the next write
+        wakeup, self.wakeup = self.wakeup, asyncio.Event()
+        wakeup.set()
+
 
 class SSEManager:
     """Manages Server-Sent Events connections and broadcasting."""
 
     def __init__(self):
-        # game_code -> list of asyncio.Queue
-        self._connections: dict[str, list[asyncio.Queue]] = defaultdict(list)
+        # game_code -> broadcast channel, alive while the game has subscribers and
+        # for a while after, as long as it is among the IDLE_CHANNEL_LIMIT most
+        # recently idle ones
+        self._channels: dict[str, _Channel] = {}
+        self._idle: OrderedDict[str, None] = OrderedDict()
+        # game_code -> frames waiting for the next flush, and the scheduled flush
+        self._pending: dict[str, list[bytes]] = {}
+        self._flush_handles: dict[str, asyncio.TimerHandle] = {}
 
-    async def subscribe(self, game_code: str) -> AsyncGenerator[str, None]:
-        """Subscribe to events for a game. Yields SSE-formatted strings."""
-        queue: asyncio.Queue = asyncio.Queue()
-        self._connections[game_code].append(queue)
+    async def subscribe(
+        self, game_code: str, last_event_id: str | None = None
+    ) -> AsyncGenerator[bytes, None]:
+        """
+        Subscribe to events for a game. Yields SSE frames as bytes.
+
+        Starts with the game's recent events, or when reconnecting with the ID of
+        the last event received, with everything after it.
+        """
+        channel = self._channels.get(game_code)
+        if channel is None:
+            channel = self._channels[game_code] = _Channel()
+        self._idle.pop(game_code, None)
+        channel.subscribers += 1
+
+        cursor = channel.resume_cursor(last_event_id)
+        resumed = cursor is not None
+        if cursor is None:
+            cursor = channel.history_cursor()
+        replaying = cursor < channel.version
 
         try:
             while True:
-                event = await queue.get()
-                if event is None:  # Shutdown signal
+                behind = channel.version - cursor
+                if not behind:
+                    if channel.closed:
+                        break
+                    await channel.wakeup.wait()
+                    continue
+
+                if behind > len(channel.frames):
+                    # Writes this subscriber hasn't sent yet were already overwritten
+                    logger.warning(f"Evicted slow SSE subscriber from game {game_code}")
                     break
-                yield event
+
+                # Everything published since the last write goes out in one chunk
+                start = len(channel.frames) - behind
+                payload = (
+                    channel.frames[-1] if behind == 1
+                    else b"".join(itertools.islice(channel.frames, start, None))
+                )
+                if replaying:
+                    payload = b"".join((_REPLAY_START[resumed], payload, _REPLAY_END))
+                    replaying = False
+                cursor = channel.version
+                yield payload
         finally:
-            self._connections[game_code].remove(queue)
-            if not self._connections[game_code]:
-                del self._connections[game_code]
+            channel.subscribers -= 1
+            if not channel.subscribers and self._channels.get(game_code) is channel:
+                # Keep recording while nobody watches; only the oldest idle
+                # channels beyond the limit are dropped
+                self._idle[game_code] = None
+                while len(self._idle) > IDLE_CHANNEL_LIMIT:
+                    idle_code, _ = self._idle.popitem(last=False)
+                    del self._channels[idle_code]
 
-    async def broadcast(self, game_code: str, event: BaseModel | dict) -> None:
-        """Broadcast an event to all subscribers of a game."""
-        if game_code not in self._connections:
+    async def broadcast(
+        self, game_code: str, event: msgspec.Struct | BaseModel | dict | bytes
+    ) -> None:
+        """
+        Broadcast an event to all subscribers of a game.
+
+        The event is encoded once and every subscriber gets the same immutable bytes
+        frame; pass a frame from encode_event() to reuse an existing encoding.
+        Delivery happens on the next flush, at most COALESCE_WINDOW later.
+        """
+        if game_code not in self._channels:
             return
 
-        if isinstance(event, BaseModel):
-            data = event.model_dump_json()
+        sse_message = event if isinstance(event, bytes) else encode_event(event)
+
+        # Hold the frame briefly so a burst (e.g. a move followed by game_over, or a
+        # run of move_delta chunks) reaches each subscriber as a single write.
+        # Frames are concatenated whole, so clients still see separate events.
+        pending = self._pending.get(game_code)
+        if pending is None:
+            self._pending[game_code] = [sse_message]
+            self._flush_handles[game_code] = asyncio.get_running_loop().call_later(
+                COALESCE_WINDOW, self._flush, game_code
+            )
         else:
-            data = json.dumps(event)
+            pending.append(sse_message)
 
-        sse_message = f"data: {data}\n\n"
+    def _flush(self, game_code: str) -> None:
+        """Publish a game's pending frames to its channel."""
+        handle = self._flush_handles.pop(game_code, None)
+        if handle is not None:
+            handle.cancel()
+        frames = self._pending.pop(game_code, None)
+        if not frames:
+            return
 
-        for queue in self._connections[game_code]:
-            await queue.put(sse_message)
+        channel = self._channels.get(game_code)
+        if channel is not None:
+            channel.publish(frames[0] if len(frames) == 1 else b"".join(frames))
 
     async def close_game(self, game_code: str) -> None:
         """Close all connections for a game."""
-        if game_code not in self._connections:
-            return
+        # Anything still waiting in the coalescing window goes out first
+        self._flush(game_code)
 
-        for queue in self._connections[game_code]:
-            await queue.put(None)
+        # Subscribers finish sending what they have and then stop; anyone
+        # subscribing afterwards gets a fresh channel
+        channel = self._channels.pop(game_code, None)
+        self._idle.pop(game_code, None)
+        if channel is not None:
+            channel.close()
 
     def get_subscriber_count(self, game_code: str) -> int:
         """Get the number of active subscribers for a game."""
-        return len(self._connections.get(game_code, []))
+        channel = self._channels.get(game_code)
+        return channel.subscribers if channel is not None else 0
 
 
 # Global SSE manager instance
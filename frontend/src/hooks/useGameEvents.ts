@@ -24,23 +24,43 @@ export interface GameState {
   move_count?: number;
 }
 
+// Half-moves played, read from a FEN's side to move and fullmove counter
+const pliesFromFen = (fen: string): number => {
+  const [, side, , , , fullmove] = fen.split(' ');
+  return (Number(fullmove) - 1) * 2 + (side === 'b' ? 1 : 0);
+};
+
 export function useGameEvents(gameCode: string) {
   const [messages, setMessages] = useState<ChatMessage[]>([]);
   const [gameState, setGameState] = useState<GameState | null>(null);
   const [isConnected, setIsConnected] = useState(false);
   const currentAudioRef = useRef<HTMLAudioElement | null>(null);
+  // True while the server replays events that happened before this connection
+  const replayingRef = useRef(false);
+  // Position from the newest move event. Moves are broadcast before they are
+  // committed, so the API can still return the previous position for a while.
+  const latestFenRef = useRef<string | null>(null);
 
-  // Fetch initial game state on mount
-  useEffect(() => {
+  const fetchGameState = () => {
     fetch(`${API_BASE_URL}/games/${gameCode}`)
       .then(res => res.json())
-      .then(data => setGameState({
-        fen: data.board_fen,
+      .then(data => setGameState(prev => ({
+        ...prev,
         status: data.status,
         winner: data.result,
-        move_count: data.moves?.length || 0,
-      }))
+        // Never move the board back to an older committed position
+        ...(latestFenRef.current === null && {
+          fen: data.board_fen,
+          move_count: data.moves?.length || 0,
+        }),
+      })))
       .catch(console.error);
+  };
+
+  // Fetch initial game state on mount
+  useEffect(() => {
+    latestFenRef.current = null;
+    fetchGameState();
   }, [gameCode]);
 
   useEffect(() => {
@@ -53,10 +73,97 @@ export function useGameEvents(gameCode: string) {
       console.log('SSE connected');
     };
 
+    const playCommentary = (base64Audio: string) => {
+      try {
+        // Stop any currently playing audio
+        if (currentAudioRef.current) {
+          currentAudioRef.current.pause();
+          currentAudioRef.current = null;
+        }
+
+        const audioData = `data:audio/mpeg;base64,${base64Audio}`;
+        const audio = new Audio(audioData);
+        currentAudioRef.current = audio;
+
+        // Clear ref when audio finishes
+        audio.onended = () => {
+          currentAudioRef.current = null;
+        };
+
+        audio.play().catch(err => console.warn('Audio playback failed:', err));
+      } catch (err) {
+        console.warn('Failed to create audio:', err);
+      }
+    };
+
     eventSource.onmessage = (event) => {
       try {
         const data = JSON.parse(event.data);
 
+        // Events sent on connect already happened: show them, but don't replay
+        // their audio or refetch the state for each one
+        if (data.type === 'replay_start') {
+          replayingRef.current = true;
+          // Fresh history rather than the continuation of what we have: start over
+          // so events we already show aren't added twice
+          if (!data.resumed) {
+            setMessages([]);
+          }
+          return;
+        }
+        if (data.type === 'replay_end') {
+          replayingRef.current = false;
+          fetchGameState();
+          return;
+        }
+
+        // Streamed reply text: grow the player's current thinking bubble
+        if (data.type === 'move_delta') {
+          setMessages(prev => {
+            const last = prev[prev.length - 1];
+            if (last && last.type === 'thinking' && last.player === data.color) {
+              return [...prev.slice(0, -1), { ...last, message: last.message + data.text }];
+            }
+            return [...prev, {
+              id: `${Date.now()}-${Math.random()}`,
+              player: data.color,
+              message: data.text,
+              timestamp: new Date(),
+              type: 'thinking',
+            }];
+          });
+          return;
+        }
+
+        // Commentary audio follows its move event once it has been synthesized
+        if (data.type === 'commentary_audio') {
+          setMessages(prev => {
+            for (let i = prev.length - 1; i >= 0; i--) {
+              if (prev[i].type === 'action' && prev[i].player === data.color) {
+                const updated = [...prev];
+                updated[i] = { ...prev[i], commentaryAudio: data.audio };
+                return updated;
+              }
+            }
+            return prev;
+          });
+          if (!replayingRef.current) {
+            playCommentary(data.audio);
+          }
+          return;
+        }
+
+        // The move event carries the new position, so the board follows it directly
+        if (data.type === 'move') {
+          latestFenRef.current = data.board_fen;
+          setGameState(prev => ({
+            ...prev,
+            status: 'in_progress',
+            fen: data.board_fen,
+            move_count: pliesFromFen(data.board_fen),
+          }));
+        }
+
         // Build message based on event type
         let messageText = '';
         if (data.type === 'thinking') {
@@ -75,51 +182,18 @@ export function useGameEvents(gameCode: string) {
           type: data.type === 'move' ? 'action' :
                 data.type === 'game_over' ? 'game_over' : 'thinking',
           moveSan: data.move_san,
-          fen: data.fen,
+          fen: data.board_fen,
           // Commentary fields
           commentary: data.commentary,
-          commentaryAudio: data.commentary_audio,
           myEmotion: data.my_emotion,
           opponentEmotion: data.opponent_emotion,
         };
 
         setMessages(prev => [...prev, newMessage]);
 
-        // Play commentary audio if available
-        if (data.commentary_audio) {
-          try {
-            // Stop any currently playing audio
-            if (currentAudioRef.current) {
-              currentAudioRef.current.pause();
-              currentAudioRef.current = null;
-            }
-
-            const audioData = `data:audio/mpeg;base64,${data.commentary_audio}`;
-            const audio = new Audio(audioData);
-            currentAudioRef.current = audio;
-
-            // Clear ref when audio finishes
-            audio.onended = () => {
-              currentAudioRef.current = null;
-            };
-
-            audio.play().catch(err => console.warn('Audio playback failed:', err));
-          } catch (err) {
-            console.warn('Failed to create audio:', err);
-          }
-        }
-
-        // Fetch updated game state after move or game over
-        if (data.type === 'move' || data.type === 'game_over') {
-          fetch(`${API_BASE_URL}/games/${gameCode}`)
-            .then(res => res.json())
-            .then(apiData => setGameState({
-              fen: apiData.board_fen,
-              status: apiData.status,
-              winner: apiData.result,
-              move_count: apiData.moves?.length || 0,
-            }))
-            .catch(console.error);
+        // Game over is committed before it is broadcast; fetch the final status
+        if (data.type === 'game_over' && !replayingRef.current) {
+          fetchGameState();
         }
       } catch (error) {
         console.error('Error parsing SSE message:', error);
@@ -129,7 +203,8 @@ export function useGameEvents(gameCode: string) {
     eventSource.onerror = (error) => {
       console.error('SSE connection error:', error);
       setIsConnected(false);
-      eventSource.close();
+      // Left open, EventSource reconnects by itself and sends Last-Event-ID so
+      // the server resumes where this connection stopped
     };
 
     return () => {